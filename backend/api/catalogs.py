@@ -0,0 +1,124 @@
+import gzip
+from threading import Lock
+
+import brotli
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from foodgram.metrics import record_cache
+from recipes.models import Ingredient, Tag
+from recipes.versions import get_version
+
+
+def parse_accept_encoding(header):
+    """Кодировки из Accept-Encoding, которые клиент не запретил."""
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        name, _, value = params.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                pass
+        if quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def choose_encoding(request):
+    """Лучшая из поддерживаемых кодировок, которую принимает клиент."""
+    accepted = parse_accept_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return 'identity'
+
+
+class Catalog:
+    """Справочник, заранее сериализованный в JSON и сжатый."""
+
+    def __init__(self, data, version=None):
+        self.version = version
+        body = JSONRenderer().render(data)
+        self.bodies = {
+            'br': brotli.compress(body),
+            'gzip': gzip.compress(body, compresslevel=9),
+            'identity': body,
+        }
+
+    def response(self, request):
+        encoding = choose_encoding(request)
+        response = HttpResponse(
+            self.bodies[encoding], content_type='application/json'
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = len(self.bodies[encoding])
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        return response
+
+
+# Справочники читаются из основной базы: отстающая реплика
+# сохранила бы старые данные под новой версией.
+CATALOGS = {
+    'tags': lambda: TagSerializer(
+        Tag.objects.using('default'), many=True
+    ).data,
+    'ingredients': lambda: IngredientSerializer(
+        Ingredient.objects.using('default'), many=True
+    ).data,
+}
+
+_catalogs = {}
+_lock = Lock()
+
+
+def get_catalog(name):
+    """Справочник, пересобранный при изменении его версии."""
+    version = get_version(name)
+    catalog = _catalogs.get(name)
+    fresh = catalog is not None and catalog.version == version
+    record_cache(f'catalog:{name}', fresh)
+    if not fresh:
+        with _lock:
+            catalog = _catalogs.get(name)
+            if catalog is None or catalog.version != version:
+                _catalogs[name] = Catalog(CATALOGS[name](), version)
+    return _catalogs[name]
+
+
+class CatalogListMixin:
+    """Полный список справочника без сериализации на каждый запрос."""
+
+    catalog_name = None
+
+    def get_catalog_encoding(self, request):
+        """Кодировка готового ответа или None, если справочник не подходит.
+
+        Сжатые и несжатый ответы - разные представления, поэтому
+        кодировка входит в ETag.
+        """
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return None
+        return choose_encoding(request)
+
+    def list(self, request, *args, **kwargs):
+        if self.get_catalog_encoding(request) is None:
+            return super().list(request, *args, **kwargs)
+        return get_catalog(self.catalog_name).response(request)
+
+
+def warm_up():
+    """Сборка справочников при старте процесса."""
+    try:
+        for name in CATALOGS:
+            get_catalog(name)
+    except DatabaseError:
+        pass
@@ -0,0 +1,92 @@
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+from users.models import User
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def get_user_state(user):
+    """Версия персональных флагов пользователя одним запросом.
+
+    Количество и наибольший id избранного, корзины и подписок меняются
+    при любом добавлении или удалении, так как id только растут.
+    """
+    if user.is_anonymous:
+        return None
+    state = {}
+    for name, model in (
+        ('favorites', Favorite),
+        ('cart', ShoppingCart),
+        ('subscriptions', Subscription),
+    ):
+        rows = model.objects.filter(user=OuterRef('pk')).order_by().values(
+            'user'
+        )
+        state[f'{name}_count'] = Subquery(
+            rows.annotate(value=Count('id')).values('value')
+        )
+        state[f'{name}_last'] = Subquery(
+            rows.annotate(value=Max('id')).values('value')
+        )
+    return User.objects.filter(pk=user.pk).annotate(**state).values_list(
+        *state
+    ).get()
+
+
+class ConditionalGetMixin:
+    """Ответ 304 Not Modified без сериализации данных.
+
+    Вьюсет описывает версию данных в get_validators, ETag дополняется
+    адресом запроса и, если нужно, состоянием текущего пользователя.
+    """
+
+    per_user_validators = False
+
+    def get_validators(self, request, *args, **kwargs):
+        """Кортеж (части ETag, Last-Modified) или None без валидаторов.
+
+        По умолчанию валидаторов нет и ответ отдается как обычно.
+        """
+
+    def dispatch_conditional(self, handler, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = validators
+        if self.per_user_validators:
+            parts = (*parts, request.user.pk, get_user_state(request.user))
+        etag = make_etag(request.get_full_path(), *parts)
+        last_modified = last_modified and last_modified.timestamp()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        if self.per_user_validators:
+            patch_vary_headers(response, ('Authorization', ))
+            patch_cache_control(response, private=True)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_conditional(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_conditional(
+            super().retrieve, request, *args, **kwargs
+        )
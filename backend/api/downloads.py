@@ -0,0 +1,81 @@
+import hashlib
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http.response import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from api.generate_pdf import render_shopping_list_pdf
+from foodgram.metrics import SHOPPING_LIST_RENDER, record_cache
+from recipes.shopping_list import get_shopping_list
+
+# Увеличивается при изменении оформления файлов, чтобы сбросить кэш.
+RENDER_VERSION = 1
+
+
+def render_shopping_list_text(items, stream):
+    """Отрисовка списка покупок в виде текстового файла."""
+    stream.write("Купить в магазине:".encode())
+    for item in items:
+        stream.write(
+            f"\n{item['name']} ({item['unit']}) - "
+            f"{item['total_amount']}".encode()
+        )
+
+
+RENDERERS = {
+    "pdf": (render_shopping_list_pdf, "application/pdf"),
+    "txt": (render_shopping_list_text, "text/plain; charset=utf-8"),
+}
+
+
+def get_shopping_list_etag(user, file_format, items):
+    """ETag по содержимому списка покупок.
+
+    Любое изменение корзины или ингредиентов рецептов в ней меняет итоги,
+    а значит и ETag, поэтому устаревший файл из кэша не будет отдан.
+    """
+    digest = hashlib.sha1(
+        repr((RENDER_VERSION, user.pk, file_format, items)).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def download_shopping_list(request, file_format="pdf"):
+    """Выдача списка покупок с кэшированием готовых файлов."""
+    render, content_type = RENDERERS[file_format]
+    items = list(get_shopping_list(request.user))
+    etag = get_shopping_list_etag(request.user, file_format, items)
+    filename = f"shopping_cart.{file_format}"
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = caches["shopping_lists"]
+        key = f"shopping_list:{file_format}:{request.user.pk}"
+        cached = cache.get(key)
+        hit = cached is not None and cached[0] == etag
+        record_cache("shopping_lists", hit)
+        if hit:
+            response = HttpResponse(cached[1], content_type=content_type)
+        else:
+            stream = SpooledTemporaryFile(
+                max_size=settings.SHOPPING_LIST_SPOOL_MAX_SIZE
+            )
+            with SHOPPING_LIST_RENDER.labels(file_format).time():
+                render(items, stream)
+            size = stream.tell()
+            stream.seek(0)
+            if size <= settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                content = stream.read()
+                stream.close()
+                cache.set(key, (etag, content))
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = FileResponse(stream, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="{filename}"'
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
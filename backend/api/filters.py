@@ -1,3 +1,6 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, Q
 from django_filters.rest_framework import CharFilter, FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
@@ -20,32 +23,30 @@ class RecipeFilter(FilterSet):
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(
-        method='filter_is_favorited',
+        method='filter_related',
     )
     is_in_shopping_cart = filters.BooleanFilter(
-        method='filter_is_in_shopping_cart',
+        method='filter_related',
     )
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author', )
 
     def filter_related(self, queryset, name, value):
+        # Флаги уже аннотированы в RecipeViewSet.get_queryset.
         if value and not self.request.user.is_anonymous:
-            recipe = name.values_list('recipe', flat=True)
-            return queryset.filter(id__in=recipe)
+            return queryset.filter(**{name: True})
         return queryset
 
-    def filter_is_favorited(self, queryset, name, value):
-        return self.filter_related(
-            queryset,
-            self.request.user.favorite,
-            value,
-        )
-
-    def filter_is_in_shopping_cart(self, queryset, name, value):
-        return self.filter_related(
-            queryset,
-            self.request.user.shopping_cart,
-            value,
-        )
+    def filter_search(self, queryset, name, value):
+        # Полнотекстовый поиск по названию и описанию дополняется
+        # поиском по триграммам названия, устойчивым к опечаткам.
+        query = SearchQuery(value, config='russian', search_type='websearch')
+        return queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query)
+            + TrigramSimilarity('name', value)
+        ).order_by('-rank', '-pub_date')
@@ -1,40 +1,50 @@
-from django.http.response import HttpResponse
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics, ttfonts
 from reportlab.pdfgen import canvas
 
+FONT_NAME = "Arial"
+TITLE_SIZE = 16
+FONT_SIZE = 12
+LINE_HEIGHT = 18
+MARGIN = 56
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Загрузка шрифта один раз на процесс.
+
+    В документ reportlab встраивает только использованные глифы.
+    """
+    pdfmetrics.registerFont(ttfonts.TTFont(
+        FONT_NAME, settings.BASE_DIR / "data" / "arial.ttf"
+    ))
+    return FONT_NAME
 
-def generate_shopping_cart_pdf(user):
-    """Генерация списка покупок в виде PDF формата"""
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = ("attachment; "
-                                       "filename=shopping_cart.pdf")
-
-    p = canvas.Canvas(response)
-    arial = ttfonts.TTFont("Arial", "data/arial.ttf")
-    pdfmetrics.registerFont(arial)
-    p.setFont("Arial", 14)
-
-    ingredients = user.shopping_cart.values_list(
-        "recipe__ingredients__ingredient__name",
-        "recipe__ingredients__amount",
-        "recipe__ingredients__ingredient__unit"
-    )
-
-    ingr_list = {}
-    for name, amount, unit in ingredients:
-        if name not in ingr_list:
-            ingr_list[name] = {"amount": amount, "unit": unit}
-        else:
-            ingr_list[name]["amount"] += amount
-    height = 700
-
-    p.drawString(100, 750, "Список покупок")
-    for i, (name, data) in enumerate(ingr_list.items(), start=1):
-        p.drawString(
-            80, height, f"{i}. {name} – {data['amount']} {data['unit']}"
-        )
-        height -= 25
+
+def render_shopping_list_pdf(items, stream):
+    """Отрисовка списка покупок с переносом строк и страниц."""
+    font = register_font()
+    width, height = A4
+    text_width = width - 2 * MARGIN
+    p = canvas.Canvas(stream, pagesize=A4)
+    p.setTitle("Список покупок")
+
+    p.setFont(font, TITLE_SIZE)
+    p.drawString(MARGIN, height - MARGIN, "Список покупок")
+    y = height - MARGIN - 2 * LINE_HEIGHT
+    p.setFont(font, FONT_SIZE)
+    for i, item in enumerate(items, start=1):
+        line = f"{i}. {item['name']} – {item['total_amount']} {item['unit']}"
+        for part in simpleSplit(line, font, FONT_SIZE, text_width):
+            if y < MARGIN:
+                p.showPage()
+                p.setFont(font, FONT_SIZE)
+                y = height - MARGIN
+            p.drawString(MARGIN, y, part)
+            y -= LINE_HEIGHT
     p.showPage()
     p.save()
-
-    return response
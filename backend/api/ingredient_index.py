@@ -0,0 +1,73 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.db import DatabaseError
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+
+def fold(value):
+    """Приведение строки к виду для поиска без учета регистра и «ё»."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения."""
+
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.entries = sorted(
+            (
+                (fold(ingredient['name']), ingredient)
+                for ingredient in ingredients
+            ),
+            key=lambda entry: entry[0],
+        )
+        self.keys = [key for key, _ in self.entries]
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        query = fold(query)
+        results = []
+        start = bisect_left(self.keys, query)
+        for key, ingredient in self.entries[start:]:
+            if len(results) >= limit or not key.startswith(query):
+                break
+            results.append(ingredient)
+        if len(results) < limit:
+            for key, ingredient in self.entries:
+                if query in key and not key.startswith(query):
+                    results.append(ingredient)
+                    if len(results) >= limit:
+                        break
+        return results
+
+
+_index = None
+_lock = Lock()
+
+
+def get_ingredient_index():
+    """Индекс, перестроенный при изменении таблицы ингредиентов."""
+    global _index
+    version = get_version('ingredients')
+    if _index is None or _index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                # Из основной базы по той же причине, что и справочники.
+                _index = IngredientIndex(
+                    Ingredient.objects.using('default').values(
+                        'id', 'name', 'unit'
+                    ),
+                    version,
+                )
+    return _index  # noqa: R504 - глобальный кеш, а не временная переменная
+
+
+def warm_up():
+    """Построение индекса при старте процесса."""
+    try:
+        get_ingredient_index()
+    except DatabaseError:
+        pass
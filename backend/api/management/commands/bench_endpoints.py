@@ -0,0 +1,299 @@
+import json
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand, CommandError
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.core.wsgi import get_wsgi_application
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, share):
+    """Значение по методу ближайшего ранга из отсортированного списка."""
+    index = max(0, min(len(values) - 1, round(share * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер основных эндпоинтов: перцентили задержки, '
+        'пропускная способность, запросы к базе и сравнение с эталоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; по умолчанию приложение '
+                 'поднимается в этом процессе на свободном порту',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов к каждому эндпоинту',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Количество параллельных клиентов',
+        )
+        parser.add_argument(
+            '--endpoints', nargs='+',
+            help='Только указанные эндпоинты',
+        )
+        parser.add_argument(
+            '--prefix', default='gen',
+            help='Префикс пользователей из generate_dataset',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--save', help='Сохранить результаты в JSON-файл',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-файл с эталонными результатами, например '
+                 'bench/baseline.json (см. bench/README.md)',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Допустимое ухудшение p95 относительно эталона, %%',
+        )
+
+    def get_fixtures(self, prefix, clients):
+        users = list(
+            User.objects
+            .filter(email__endswith=f'@{prefix}.example.com')
+            .order_by('?')[:clients]
+        )
+        if not users:
+            raise CommandError(
+                'Нет пользователей набора данных, выполните generate_dataset'
+            )
+        self.tokens = [
+            Token.objects.get_or_create(user=user)[0].key for user in users
+        ]
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.author_ids = [user.pk for user in users]
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:1000]
+        )
+        self.recipe_words = sorted({
+            word
+            for name in Recipe.objects.values_list('name', flat=True)[:1000]
+            for word in name.lower().split()
+            if len(word) > 3
+        })
+
+    def request(self, method, path, token, expected=(200, )):
+        request = Request(self.base_url + path, method=method, headers={
+            'Authorization': f'Token {token}',
+        })
+        started = perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except HTTPError as error:
+            error.read()
+            status, headers = error.code, error.headers
+        duration = perf_counter() - started
+        match = QUERIES.search(headers.get('Server-Timing', ''))
+        queries = int(match[1]) if match else None
+        return duration, status in expected, queries, status
+
+    def recipes_list(self, rng, token):
+        params = rng.choice((
+            {'tags': rng.choice(self.tag_slugs)},
+            {'tags': rng.choice(self.tag_slugs),
+             'author': rng.choice(self.author_ids)},
+            {'is_favorited': 1},
+            {'is_in_shopping_cart': 1},
+            {},
+        ))
+        return [self.request(
+            'GET', f'/api/recipes/?{urlencode(params)}', token
+        )]
+
+    def recipe_detail(self, rng, token):
+        return [self.request(
+            'GET', f'/api/recipes/{rng.choice(self.recipe_ids)}/', token
+        )]
+
+    def ingredient_search(self, rng, token):
+        name = rng.choice(self.ingredient_names)[:rng.randint(1, 4)]
+        return [self.request(
+            'GET', f'/api/ingredients/?{urlencode({"name": name})}', token
+        )]
+
+    def recipe_search(self, rng, token):
+        word = rng.choice(self.recipe_words)
+        if rng.random() < 0.3:
+            # Опечатка: проверяется поиск по триграммам.
+            position = rng.randrange(len(word))
+            word = word[:position] + word[position + 1:]
+        return [self.request(
+            'GET', f'/api/recipes/?{urlencode({"search": word})}', token
+        )]
+
+    def subscriptions(self, rng, token):
+        return [self.request(
+            'GET', '/api/users/subscriptions/?recipes_limit=3', token
+        )]
+
+    def toggle(self, action, rng, token):
+        # Удаляется только то, что было добавлено этим же запросом,
+        # поэтому набор данных после замера не меняется.
+        path = f'/api/recipes/{rng.choice(self.recipe_ids)}/{action}/'
+        results = [self.request('POST', path, token, (201, 400))]
+        if results[0][3] == 201:
+            results.append(self.request('DELETE', path, token, (204, )))
+        return results
+
+    def favorite_toggle(self, rng, token):
+        return self.toggle('favorite', rng, token)
+
+    def cart_toggle(self, rng, token):
+        return self.toggle('shopping_cart', rng, token)
+
+    def download_shopping_cart(self, rng, token):
+        return [self.request(
+            'GET', '/api/recipes/download_shopping_cart/', token
+        )]
+
+    ENDPOINTS = (
+        'recipes_list', 'recipe_detail', 'recipe_search',
+        'ingredient_search', 'subscriptions', 'favorite_toggle', 'cart_toggle',
+        'download_shopping_cart',
+    )
+
+    def run_endpoint(self, name, count, concurrency, seed):
+        scenario = getattr(self, name)
+
+        def worker(number):
+            rng = random.Random(f'{seed}:{name}:{number}')
+            token = self.tokens[number % len(self.tokens)]
+            results = []
+            for _ in range(number, count, concurrency):
+                results.extend(scenario(rng, token))
+            return results
+
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = [
+                result
+                for chunk in executor.map(worker, range(concurrency))
+                for result in chunk
+            ]
+        elapsed = perf_counter() - started
+        latencies = sorted(duration for duration, *_ in results)
+        queries = [
+            count for _, _, count, _ in results if count is not None
+        ]
+        return {
+            'requests': len(results),
+            'errors': sum(not ok for _, ok, *_ in results),
+            'rps': len(results) / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries': (
+                sum(queries) / len(queries) if queries else None
+            ),
+        }
+
+    def start_server(self):
+        server = ThreadedWSGIServer(
+            ('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=True
+        )
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def compare(self, results, baseline, threshold):
+        """Сравнение с эталоном, возвращает список регрессий."""
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            change = (result['p95_ms'] / base['p95_ms'] - 1) * 100
+            queries = result['queries'], base['queries']
+            self.stdout.write(
+                f'{name:<24} p95 {change:+.0f}%, запросов к базе '
+                + ' -> '.join(
+                    '-' if count is None else f'{count:.1f}'
+                    for count in reversed(queries)
+                )
+            )
+            if change > threshold:
+                regressions.append(f'{name}: p95 хуже на {change:.0f}%')
+            if None not in queries and queries[0] > queries[1]:
+                regressions.append(
+                    f'{name}: запросов к базе {queries[1]:.1f} -> '
+                    f'{queries[0]:.1f}'
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        names = options['endpoints'] or self.ENDPOINTS
+        unknown = set(names) - set(self.ENDPOINTS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные эндпоинты: {", ".join(sorted(unknown))}'
+            )
+        concurrency = options['concurrency']
+        self.get_fixtures(options['prefix'], concurrency)
+        server = None
+        if options['url']:
+            self.base_url = options['url'].rstrip('/')
+        else:
+            server = self.start_server()
+            self.base_url = f'http://127.0.0.1:{server.server_port}'
+        results = {}
+        try:
+            for name in names:
+                results[name] = result = self.run_endpoint(
+                    name, options['requests'], concurrency, options['seed']
+                )
+                self.stdout.write(
+                    f'{name:<24} p50 {result["p50_ms"]:7.1f} мс  '
+                    f'p95 {result["p95_ms"]:7.1f} мс  '
+                    f'p99 {result["p99_ms"]:7.1f} мс  '
+                    f'{result["rps"]:7.1f} запр/с  '
+                    f'запросов к базе {result["queries"] or 0:5.1f}  '
+                    f'ошибок {result["errors"]}'
+                )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                results, baseline, options['threshold']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии относительно эталона:\n'
+                    + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
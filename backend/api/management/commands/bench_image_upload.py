@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+from time import perf_counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import BaseCommand
+from django.test.client import MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from api.parsers import MultiPartJSONParser
+from api.serializers import RecipeImageField
+
+BOUNDARY = 'BenchImageUploadBoundary'
+CONTENT_TYPES = {
+    'base64': 'application/json',
+    'multipart': MULTIPART_CONTENT.replace('BoUnDaRyStRiNg', BOUNDARY),
+}
+
+
+def peak_rss():
+    """Пиковый объем резидентной памяти процесса в мегабайтах.
+
+    ru_maxrss на Linux сохраняется при exec и может показывать пик
+    родительского процесса, поэтому сначала читается VmHWM.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Пиковая память при загрузке картинки base64 и multipart'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, nargs=2, default=(4000, 3000),
+            metavar=('WIDTH', 'HEIGHT'),
+            help='Размер тестовой картинки в пикселях',
+        )
+        parser.add_argument(
+            '--worker', choices=CONTENT_TYPES,
+            help='Служебный режим: разбор одного запроса из файла --body',
+        )
+        parser.add_argument('--body', help='Файл с телом запроса')
+
+    def make_bodies(self, width, height, directory):
+        image = Image.frombytes(
+            'RGB', (width, height), os.urandom(width * height * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=95)
+        content = buffer.getvalue()
+        fields = {
+            'name': 'Тест', 'text': 'Тест', 'cooking_time': 10,
+            'tags': [1], 'ingredients': [{'id': 1, 'amount': 10}],
+        }
+        bodies = {
+            'base64': json.dumps({
+                **fields,
+                'image': 'data:image/jpeg;base64,'
+                + base64.b64encode(content).decode(),
+            }).encode(),
+            'multipart': encode_multipart(BOUNDARY, {
+                'data': json.dumps(fields),
+                'image': ContentFile(content, name='image.jpg'),
+            }),
+        }
+        paths = {}
+        for mode, body in bodies.items():
+            paths[mode] = os.path.join(directory, mode)
+            with open(paths[mode], 'wb') as file:
+                file.write(body)
+        return len(content), paths
+
+    def run_worker(self, mode, path):
+        before = peak_rss()
+        started = perf_counter()
+        with open(path, 'rb') as body:
+            request = Request(WSGIRequest({
+                'REQUEST_METHOD': 'POST',
+                'PATH_INFO': '/api/recipes/',
+                'CONTENT_TYPE': CONTENT_TYPES[mode],
+                'CONTENT_LENGTH': str(os.path.getsize(path)),
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'wsgi.input': body,
+                'wsgi.url_scheme': 'http',
+            }), parsers=[JSONParser(), MultiPartJSONParser()])
+            RecipeImageField().run_validation(request.data['image'])
+        self.stdout.write(json.dumps({
+            'rss': peak_rss() - before,
+            'seconds': perf_counter() - started,
+        }))
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.run_worker(options['worker'], options['body'])
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            size, paths = self.make_bodies(*options['size'], directory)
+            self.stdout.write(f'Картинка: {size / 2 ** 20:.1f} МБ')
+            for mode, path in paths.items():
+                # Каждый замер в отдельном процессе, чтобы пик памяти
+                # одного режима не влиял на другой.
+                result = json.loads(subprocess.run(
+                    [
+                        sys.executable,
+                        os.path.join(settings.BASE_DIR, 'manage.py'),
+                        'bench_image_upload', '--worker', mode,
+                        '--body', path,
+                    ],
+                    check=True, capture_output=True, text=True,
+                ).stdout)
+                self.stdout.write(
+                    f'{mode}: тело {os.path.getsize(path) / 2 ** 20:.1f} МБ, '
+                    f'прирост пиковой памяти {result["rss"]:.1f} МБ, '
+                    f'{result["seconds"] * 1000:.0f} мс'
+                )
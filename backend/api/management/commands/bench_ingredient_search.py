@@ -0,0 +1,50 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.filters import IngredientFilter
+from api.ingredient_index import get_ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Сравнение поиска ингредиентов по индексу и через фильтр'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries', nargs='+',
+            default=['с', 'сы', 'сыр', 'мол', 'масло', 'ябл', 'перец'],
+            help='Поисковые запросы, как при наборе в форме',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help='Количество повторов для каждого запроса',
+        )
+
+    def measure(self, search, queries, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                search(query)
+        return (perf_counter() - started) / (repeat * len(queries))
+
+    def handle(self, *args, **options):
+        queries, repeat = options['queries'], options['repeat']
+        index = get_ingredient_index()
+        index_time = self.measure(
+            lambda query: index.search(
+                query, settings.INGREDIENT_SEARCH_LIMIT
+            ),
+            queries, repeat,
+        )
+        filter_time = self.measure(
+            lambda query: list(IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all()
+            ).qs.values('id', 'name', 'unit')),
+            queries, repeat,
+        )
+        self.stdout.write(
+            f'Индекс: {index_time * 1e6:.0f} мкс на запрос\n'
+            f'Фильтр: {filter_time * 1e6:.0f} мкс на запрос'
+        )
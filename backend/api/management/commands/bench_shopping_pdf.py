@@ -0,0 +1,49 @@
+from io import BytesIO
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.generate_pdf import register_font, render_shopping_list_pdf
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости генерации PDF списка покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Количество различных ингредиентов в списке',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов для каждого размера',
+        )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        register_font()
+        self.stdout.write(
+            f'Загрузка шрифта: {(perf_counter() - started) * 1000:.1f} мс'
+        )
+        for size in options['sizes']:
+            items = [
+                {
+                    'name': f'Ингредиент номер {i}',
+                    'total_amount': i * 10,
+                    'unit': 'г',
+                }
+                for i in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                stream = BytesIO()
+                started = perf_counter()
+                render_shopping_list_pdf(items, stream)
+                timings.append(perf_counter() - started)
+            timings.sort()
+            self.stdout.write(
+                f'{size:>6} ингредиентов: '
+                f'медиана {timings[len(timings) // 2] * 1000:.1f} мс, '
+                f'максимум {timings[-1] * 1000:.1f} мс, '
+                f'{len(stream.getvalue()) / 1024:.1f} КБ'
+            )
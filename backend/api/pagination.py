@@ -0,0 +1,41 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация рецептов по курсору (pub_date, id)."""
+
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Пагинация подписок по курсору в порядке оформления подписки."""
+
+    ordering = ('-subscription_id', )
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class CursorPaginationMixin:
+    """Пагинация по курсору по запросу ?pagination=cursor.
+
+    Без параметра остается пагинация по номеру страницы.
+    """
+
+    cursor_pagination_class = None
+
+    def get_cursor_pagination_class(self):
+        return self.cursor_pagination_class
+
+    @property
+    def paginator(self):
+        params = self.request.query_params
+        pagination_class = self.get_cursor_pagination_class()
+        if (
+            not hasattr(self, '_paginator')
+            and pagination_class is not None
+            and (params.get('pagination') == 'cursor' or 'cursor' in params)
+        ):
+            self._paginator = pagination_class()
+        return super().paginator
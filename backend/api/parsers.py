@@ -0,0 +1,46 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class ParsedData(dict):
+    """Данные формы, к которым DRF добавляет файлы по одному, а не списком."""
+
+    def copy(self):
+        return ParsedData(self)
+
+    def update(self, other=(), **kwargs):
+        if isinstance(other, MultiValueDict):
+            other = other.items()
+        super().update(other, **kwargs)
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """Multipart-запрос с файлами и вложенными полями в JSON.
+
+    Файлы сохраняются обработчиками загрузки Django, а поля со списками
+    (tags, ingredients) передаются строкой JSON в части data или
+    в одноименных частях формы.
+    """
+
+    json_fields = ('data', 'tags', 'ingredients')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key in parsed.data:
+            value = parsed.data[key]
+            if key in self.json_fields:
+                try:
+                    value = json.loads(value)
+                except ValueError as error:
+                    raise ParseError(f'Некорректный JSON в {key}: {error}')
+            if key == 'data':
+                if not isinstance(value, dict):
+                    raise ParseError('Поле data должно быть объектом JSON')
+                data.update(value)
+            else:
+                data[key] = value
+        return DataAndFiles(ParsedData(data), parsed.files)
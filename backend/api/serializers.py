@@ -1,13 +1,30 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
+from foodgram.instrumentation import measure_serializer
 from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
                             ShoppingCart, Tag)
+from recipes.shopping_list import apply_totals_deltas
 from users.models import User
 
 
-class UsersSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Учет времени сериализации в метриках запроса."""
+
+    def to_representation(self, instance):
+        with measure_serializer():
+            return super().to_representation(instance)
+
+
+class UsersSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения информации о пользователе."""
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -20,6 +37,8 @@ class UsersSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context["request"].user.is_authenticated:
             return obj.following.filter(
                 user=self.context["request"].user, author=obj.pk
@@ -27,19 +46,46 @@ class UsersSerializer(serializers.ModelSerializer):
         return False
 
 
-class RecipeInfoSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки рецепта."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in value.get('files', {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка файлом из multipart-запроса или строкой base64."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        image = serializers.ImageField.to_internal_value(self, data)
+        extension = image.image.format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        image.name = f'{uuid.uuid4()}.{extension}'
+        return image
+
+
+class RecipeInfoSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения краткой информации о рецепте."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class FollowSerializer(UsersSerializer):
     """Сериализатор для работы с подписками."""
 
     recipes = SerializerMethodField(read_only=True)
-    recipes_count = SerializerMethodField(read_only=True)
 
     class Meta(UsersSerializer.Meta):
         fields = (
@@ -47,16 +93,14 @@ class FollowSerializer(UsersSerializer):
         )
 
     def get_queryset(self, obj):
-        return Recipe.objects.filter(author=obj.pk)
+        if hasattr(obj, 'latest_recipes'):
+            return obj.latest_recipes
+        return Recipe.objects.filter(author=obj.pk)[
+            :self.context.get('recipes_limit')
+        ]
 
     def get_recipes(self, obj):
         queryset = self.get_queryset(obj)
-        recipes_limit = (
-            self.context['request'].query_params.get('recipes_limit')
-        )
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
-
         serializer = RecipeInfoSerializer(
             queryset,
             many=True,
@@ -64,11 +108,8 @@ class FollowSerializer(UsersSerializer):
         )
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return self.get_queryset(obj).count()
-
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения тегов."""
 
     class Meta:
@@ -76,7 +117,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug', )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения ингредиентов."""
 
     class Meta:
@@ -84,7 +125,9 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'unit', )
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор для отображения ингредиентов в рецепте."""
 
     id = serializers.IntegerField(source='ingredient.id')
@@ -96,7 +139,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения рецептов."""
 
     tags = TagSerializer(many=True)
@@ -107,25 +150,30 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'image_variants', 'text', 'cooking_time',
         )
 
     def get_request(self, ):
         return self.context.get('request')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.get_request().user
         if user.is_authenticated:
             return Favorite.objects.filter(user=user, recipe=obj).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.get_request() and self.get_request().user.is_authenticated:
             return ShoppingCart.objects.filter(
                 user=self.get_request().user, recipe=obj
@@ -133,17 +181,15 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
 
-class CreateRecipeSerializer(serializers.ModelSerializer):
+class CreateRecipeSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """ Сериализатор для создания рецепта """
     ingredients = RecipeIngredientSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all(),
-        error_messages={'does_not_exist': 'Указанного тега не существует'}
-    )
-    image = Base64ImageField(max_length=None)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeImageField(max_length=None)
     author = UsersSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
 
@@ -153,30 +199,44 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'id', 'tags', 'author', 'ingredients',
             'name', 'image', 'text', 'cooking_time',)
 
-    def validate(self, data):
-        for tag in data['tags']:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    {'tags': 'Указанного тега не существует'}
-                )
-        if data['cooking_time'] < 1:
+    def validate_image(self, value):
+        width, height = value.image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
             raise serializers.ValidationError(
-                {'cooking_time': 'Время готовки не меньше одной минуты'}
+                'Слишком большое разрешение картинки'
             )
-        ingredients = data['ingredients']
-        ingredients_list = []
-        if not ingredients:
+        return value
+
+    def validate_tags(self, value):
+        tags = list(dict.fromkeys(value))
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise serializers.ValidationError('Указанного тега не существует')
+        return tags
+
+    def validate_cooking_time(self, value):
+        if value < 1:
             raise serializers.ValidationError(
-                {'ingredients': 'Отсутствуют ингридиенты'}
+                'Время готовки не меньше одной минуты'
             )
-        for ingredient in ingredients:
+        return value
+
+    def validate_ingredients(self, value):
+        ingredients_list = []
+        if not value:
+            raise serializers.ValidationError('Отсутствуют ингридиенты')
+        for ingredient in value:
             if ingredient['ingredient']['id'] in ingredients_list:
                 raise serializers.ValidationError(
-                    {'ingredients': 'Ингридиенты должны быть уникальны'}
+                    'Ингридиенты должны быть уникальны'
                 )
             ingredients_list.append(ingredient['ingredient']['id'])
-
-        return data
+        if Ingredient.objects.filter(
+            id__in=ingredients_list
+        ).count() != len(ingredients_list):
+            raise serializers.ValidationError(
+                'Указанного ингредиента не существует'
+            )
+        return value
 
     def create_ingredient_amount(self, ingredient_data, recipe):
         return IngredientAmount(
@@ -185,6 +245,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             recipe=recipe,
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
@@ -202,71 +263,82 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    def update_ingredient_amounts(self, instance, ingredients_data):
+        """Применение к ингредиентам рецепта только изменившихся строк.
+
+        Возвращает изменения количества по новым и измененным
+        ингредиентам для итогов корзин, в которых лежит рецепт: пакетные
+        вставка и обновление сигналов не отправляют. Удаленные строки
+        вычитаются из итогов сигналом post_delete.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=instance)
+        }
+        changed, created, deltas = [], [], {}
+        for ingredient_data in ingredients_data:
+            ingredient_id = ingredient_data['ingredient']['id']
+            amount = current.pop(ingredient_id, None)
+            if amount is None:
+                created.append(
+                    self.create_ingredient_amount(ingredient_data, instance)
+                )
+                deltas[ingredient_id] = ingredient_data['amount']
+            elif amount.amount != ingredient_data['amount']:
+                deltas[ingredient_id] = (
+                    ingredient_data['amount'] - amount.amount
+                )
+                amount.amount = ingredient_data['amount']
+                changed.append(amount)
+        if current:
+            IngredientAmount.objects.filter(
+                pk__in=[amount.pk for amount in current.values()]
+            ).delete()
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientAmount.objects.bulk_create(created)
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        ingredients_data = validated_data.pop('ingredients')
-
-        ingredient_amounts = [
-            self.create_ingredient_amount(ingredient_data, instance)
-            for ingredient_data in ingredients_data
-        ]
-        IngredientAmount.objects.bulk_create(ingredient_amounts)
-
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            deltas = self.update_ingredient_amounts(
+                instance, validated_data.pop('ingredients')
+            )
+            apply_totals_deltas(instance.pk, deltas)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', Prefetch(
+            'ingredients',
+            queryset=IngredientAmount.objects.select_related('ingredient'),
+        ))
         return RecipeSerializer(instance, context={
             'request': self.context.get('request')
         }).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для отображения полей избранного."""
 
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для избранных рецептов."""
+    image_variants = ImageVariantsField()
 
     class Meta:
-        model = Favorite
-        fields = ('user', 'recipe',)
-
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-        if user.favorite.filter(recipe=recipe).exists():
-            raise serializers.ValidationError('Рецепт уже добавлен')
-        return data
-
-    def to_representation(self, instance):
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
-
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка покупок"""
 
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe',)
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного изменения избранного и корзины."""
 
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-        if user.shopping_cart.filter(recipe=recipe).exists():
-            raise serializers.ValidationError('Рецепт уже добавлен')
-        return data
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BATCH_MAX_SIZE,
+    )
 
-    def to_representation(self, instance):
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,232 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.shopping_list import aggregate_shopping_list, get_shopping_list
+from users.models import User
+
+
+# Данные TestCase не зафиксированы и с реплик не видны.
+@override_settings(REPLICA_DATABASES=[])
+class RecipeListQueriesTest(APITestCase):
+    """Количество запросов списка рецептов не зависит от размера страницы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Анна', last_name='Иванова', password='password',
+        )
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Иван', last_name='Петров', password='password',
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}', unit='г')
+            for number in range(4)
+        ]
+        for number in range(8):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=100,
+                )
+                for ingredient in ingredients
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, author=authors[0])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Первый запрос прогревает кэш справочников тегов и ингредиентов.
+        self.client.get('/api/recipes/')
+
+    def assert_constant_queries(self, small, large):
+        """Страницы из 2 и 6 рецептов стоят одинакового числа запросов."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', small)
+        self.assertEqual(len(response.data['results']), 2)
+        with self.assertNumQueries(len(context)):
+            response = self.client.get('/api/recipes/', large)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_page_number_pagination(self):
+        # Рецептов 8, на странице 6: на второй странице остаются 2.
+        self.assert_constant_queries({'page': 2}, {'page': 1})
+
+    def test_cursor_pagination(self):
+        self.assert_constant_queries(
+            {'pagination': 'cursor', 'limit': 2},
+            {'pagination': 'cursor', 'limit': 6},
+        )
+
+    def test_filtered_by_tag(self):
+        self.assert_constant_queries(
+            {'tags': 'lunch', 'page': 2}, {'tags': 'lunch', 'page': 1},
+        )
+
+
+class ShoppingCartTotalsTest(APITestCase):
+    """Итоги корзин совпадают с пересчетом по содержимому корзин."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.other = [
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name='Анна', last_name='Иванова', password='password',
+            )
+            for name in ('author', 'reader', 'other')
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}', unit='г')
+            for number in range(5)
+        ]
+        cls.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+            )
+            # Соседние рецепты делят ингредиенты, чтобы итоги суммировались.
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[number + offset],
+                    amount=10 * (number + 1) + offset,
+                )
+                for offset in range(3)
+            )
+            cls.recipes.append(recipe)
+
+    def assert_totals(self):
+        for user in (self.author, self.reader, self.other):
+            self.assertEqual(
+                list(get_shopping_list(user)),
+                list(aggregate_shopping_list(user)),
+            )
+
+    def add_to_carts(self, *recipes):
+        for user in (self.reader, self.other):
+            self.client.force_authenticate(user)
+            for recipe in recipes:
+                response = self.client.post(
+                    f'/api/recipes/{recipe.pk}/shopping_cart/'
+                )
+                self.assertEqual(response.status_code, 201)
+        self.assert_totals()
+        self.assertTrue(get_shopping_list(self.reader).exists())
+
+    def test_add_and_remove(self):
+        self.add_to_carts(*self.recipes[:2])
+        self.client.force_authenticate(self.reader)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_batch_add_and_remove(self):
+        self.client.force_authenticate(self.reader)
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/', {'recipes': recipe_ids},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+        self.assertTrue(get_shopping_list(self.reader).exists())
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/', {'recipes': recipe_ids[1:]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+
+    def test_recipe_update(self):
+        self.add_to_carts(*self.recipes)
+        recipe = self.recipes[1]
+        current = list(recipe.ingredients.all())
+        self.client.force_authenticate(self.author)
+        # Одно количество меняется, одна строка остается как есть,
+        # одна удаляется и один ингредиент добавляется.
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {'ingredients': [
+                {'id': current[0].ingredient_id, 'amount': 99},
+                {'id': current[1].ingredient_id, 'amount': current[1].amount},
+                {'id': self.ingredients[0].pk, 'amount': 5},
+            ]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+
+    def test_recipe_delete(self):
+        self.add_to_carts(*self.recipes)
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+        self.recipes[1].delete()
+        self.assert_totals()
+
+    def test_author_delete(self):
+        self.add_to_carts(*self.recipes)
+        self.author.delete()
+        self.assert_totals()
+        self.assertFalse(get_shopping_list(self.reader).exists())
+
+    def test_cart_changes_outside_api(self):
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipes[0])
+        self.assert_totals()
+        item = ShoppingCart.objects.create(
+            user=self.reader, recipe=self.recipes[1]
+        )
+        item.recipe = self.recipes[2]
+        item.save()
+        self.assert_totals()
+        item.delete()
+        self.assert_totals()
+
+    def test_ingredient_amount_changes_outside_api(self):
+        self.add_to_carts(*self.recipes)
+        amount = self.recipes[0].ingredients.first()
+        amount.amount += 50
+        amount.save()
+        self.assert_totals()
+        amount.ingredient = self.ingredients[4]
+        amount.save()
+        self.assert_totals()
+        IngredientAmount.objects.create(
+            recipe=self.recipes[0], ingredient=self.ingredients[3], amount=7
+        )
+        self.assert_totals()
+        amount.delete()
+        self.assert_totals()
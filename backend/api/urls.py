@@ -1,14 +1,15 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                       UsersViewSet)
+from api.views import (IngredientViewSet, ProfileViewSet, RecipeViewSet,
+                       TagViewSet, UsersViewSet)
 
 router = routers.DefaultRouter()
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', UsersViewSet, basename='users')
+router.register('profiles', ProfileViewSet, basename='profiles')
 
 urlpatterns = [
     path('', include(router.urls)),
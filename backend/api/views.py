@@ -1,34 +1,124 @@
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from api.catalogs import CatalogListMixin
+from api.conditional import ConditionalGetMixin
+from api.downloads import RENDERERS, download_shopping_list
 from api.filters import IngredientFilter, RecipeFilter
-from api.generate_pdf import generate_shopping_cart_pdf
+from api.ingredient_index import get_ingredient_index
+from api.pagination import (CursorPaginationMixin, RecipeCursorPagination,
+                            SubscriptionCursorPagination)
+from api.parsers import MultiPartJSONParser
 from api.permissions import AuthorPermission
-from api.serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                             FollowSerializer, IngredientSerializer,
-                             RecipeSerializer, ShoppingCartSerializer,
+from api.serializers import (CreateRecipeSerializer, FollowSerializer,
+                             IngredientSerializer, RecipeIdsSerializer,
+                             RecipeSerializer, RecipeShortSerializer,
                              TagSerializer, UsersSerializer)
-from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
-                            Subscription, Tag)
+from foodgram.profiling import (format_profile, get_profile_path,
+                                list_profiles)
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.subscriptions import (create_subscription,
+                                   delete_subscription)
+from recipes.timeline import get_timeline
+from recipes.user_recipes import add_user_recipes, remove_user_recipes
+from recipes.versions import get_version
 from users.models import User
 
 
-class TagViewSet(viewsets.ModelViewSet):
+def annotate_is_subscribed(queryset, user):
+    """Флаг подписки текущего пользователя на авторов одним подзапросом."""
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(is_subscribed=Exists(
+        Subscription.objects.filter(user=user, author=OuterRef('pk'))
+    ))
+
+
+def get_latest_recipes(author_ids, limit):
+    """Последние рецепты каждого из авторов одним запросом."""
+    if not author_ids:
+        return Recipe.objects.none()
+    ranked = (
+        Recipe.objects
+        .filter(author_id__in=author_ids)
+        .order_by()
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ))
+        .values('id', 'position')
+    )
+    sql, params = ranked.query.sql_with_params()
+    return Recipe.objects.filter(pk__in=RawSQL(
+        f'SELECT id FROM ({sql}) ranked WHERE position <= %s',
+        (*params, limit),
+    )).only(
+        'id', 'author_id', 'name', 'image', 'image_variants', 'cooking_time'
+    )
+
+
+def parse_pk(value):
+    """Числовой id из адреса, для остальных значений ответ 404."""
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404
+
+
+def get_recipes_limit(request):
+    """Проверенное значение параметра recipes_limit."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return settings.RECIPES_LIMIT_MAX
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = -1
+    if recipes_limit < 0:
+        raise ValidationError(
+            {'recipes_limit': 'Должно быть неотрицательным целым числом'}
+        )
+    return min(recipes_limit, settings.RECIPES_LIMIT_MAX)
+
+
+class TagViewSet(
+    ConditionalGetMixin, CatalogListMixin, viewsets.ModelViewSet
+):
     """Вьюсет для работы с тегами."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    catalog_name = 'tags'
 
+    def get_validators(self, request, *args, **kwargs):
+        return (
+            get_version('tags'), self.get_catalog_encoding(request)
+        ), None
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(
+    ConditionalGetMixin, CatalogListMixin, viewsets.ModelViewSet
+):
     """Вьюсет для работы с ингредиентами."""
 
     queryset = Ingredient.objects.all()
@@ -36,9 +126,27 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    catalog_name = 'ingredients'
 
+    def get_validators(self, request, *args, **kwargs):
+        return (
+            get_version('ingredients'), self.get_catalog_encoding(request)
+        ), None
 
-class UsersViewSet(UserViewSet):
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('name'):
+            return self.dispatch_conditional(
+                self.search, request, *args, **kwargs
+            )
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        return Response(get_ingredient_index().search(
+            request.query_params['name'], settings.INGREDIENT_SEARCH_LIMIT
+        ))
+
+
+class UsersViewSet(CursorPaginationMixin, UserViewSet):
     """Вьюсет для работы с пользователями и подписками. """
 
     queryset = User.objects.all()
@@ -46,103 +154,223 @@ class UsersViewSet(UserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     http_method_names = ["get", "post", "delete", "head"]
 
-    def get_user_and_author(self, request, id):
-        return request.user, get_object_or_404(User, id=id)
+    def get_cursor_pagination_class(self):
+        if self.action == 'subscriptions':
+            return SubscriptionCursorPagination
+        return None
 
     @action(
         methods=["POST", ],
         detail=True,
     )
     def subscribe(self, request, id):
-        user, author = self.get_user_and_author(request, id)
-        if user == author:
+        author_id = parse_pk(id)
+        # Параметры проверяются до записи, чтобы ошибка в них не оставляла
+        # созданную подписку.
+        recipes_limit = get_recipes_limit(request)
+        if author_id == request.user.pk:
             return Response(
                 {"error": "Невозможно подписаться на себя"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        subscription, created = Subscription.objects.get_or_create(
-            user=user, author=author
-        )
-        if created:
+        author = create_subscription(request.user, author_id)
+        if author is None:
+            get_object_or_404(User, pk=author_id)
             return Response(
-                FollowSerializer(
-                    author, context={"request": request}
-                ).data,
-                status=status.HTTP_201_CREATED,
+                {"error": "Вы уже подписаны"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        author.is_subscribed = True
         return Response(
-            {"error": "Вы уже подписаны"},
-            status=status.HTTP_400_BAD_REQUEST,
+            FollowSerializer(author, context={
+                "request": request,
+                "recipes_limit": recipes_limit,
+            }).data,
+            status=status.HTTP_201_CREATED,
         )
 
     @subscribe.mapping.delete
     def subscribe_delete(self, request, id):
-        get_object_or_404(
-            Subscription, user=request.user,
-            author=get_object_or_404(User, pk=id)
-        ).delete()
+        if not delete_subscription(request.user, parse_pk(id)):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
+        recipes_limit = get_recipes_limit(request)
+        authors = self.paginate_queryset(
+            User.objects.filter(following__user=request.user).annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+                subscription_id=F('following__id'),
+            )
+        )
+        latest_recipes = {author.id: [] for author in authors}
+        for recipe in get_latest_recipes(latest_recipes, recipes_limit):
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest_recipes[author.id]
         serializer = FollowSerializer(
-            self.paginate_queryset(
-                User.objects.filter(following__user=request.user)
-            ),
+            authors,
             many=True,
-            context={"request": request}
+            context={"request": request, "recipes_limit": recipes_limit}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet
+):
     """Вьюсет для работы с рецептами."""
 
     queryset = Recipe.objects.all()
     permission_classes = (AuthorPermission,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cursor_pagination_class = RecipeCursorPagination
+    per_user_validators = True
+    parser_classes = (JSONParser, MultiPartJSONParser)
+
+    def get_validators(self, request, *args, **kwargs):
+        catalog = (get_version('tags'), get_version('ingredients'))
+        if self.action == 'retrieve':
+            updated_at = Recipe.objects.filter(
+                pk=parse_pk(kwargs['pk'])
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                return None
+            # Last-Modified не учитывает персональные флаги,
+            # поэтому отдается только анонимным пользователям.
+            return (
+                (updated_at, *catalog),
+                updated_at if request.user.is_anonymous else None,
+            )
+        # Общая версия рецептов вместо агрегата по выборке: подсчет
+        # всех подходящих рецептов и повтор поиска стоили бы больше,
+        # чем сам ответ. Фильтры и курсор входят в ETag через адрес.
+        return (get_version('recipes'), *catalog), None
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch('author', queryset=annotate_is_subscribed(
+                User.objects.all(), user
+            )),
+            'tags',
+            Prefetch(
+                'ingredients',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
 
     def get_serializer_class(self):
         if self.request.method == "GET":
             return RecipeSerializer
         return CreateRecipeSerializer
 
-    def send_message(self, ingredients, filename):
-        shopping_list = "Купить в магазине:"
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__unit']}) - "
-                f"{ingredient['amount']}"
+    def get_cursor_pagination_class(self):
+        # Курсор задает порядок по дате и потерял бы сортировку
+        # результатов поиска по релевантности.
+        if self.action == 'feed' or self.request.query_params.get('search'):
+            return None
+        return super().get_cursor_pagination_class()
+
+    def add_to_model(self, model_class, request, pk):
+        recipe_id = parse_pk(pk)
+        if not add_user_recipes(model_class, request.user, [recipe_id]):
+            get_object_or_404(Recipe, pk=recipe_id)
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['Рецепт уже добавлен']}
             )
-        file = filename
-        response = HttpResponse(shopping_list, content_type="text/plain")
-        response["Content-Disposition"] = f'attachment; filename="{file}.txt"'
-        return response
-
-    def add_to_model(self, serializer_class, model_class, request, pk):
-        context = {"request": request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {"user": request.user.id, "recipe": recipe.id}
-        serializer = serializer_class(data=data, context=context)
+        return Response(
+            RecipeShortSerializer(
+                Recipe.objects.get(pk=recipe_id), context={"request": request}
+            ).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def remove_from_model(self, model_class, request, pk):
+        if not remove_user_recipes(
+            model_class, request.user, [parse_pk(pk)]
+        ):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def add_many_to_model(self, model_class, request):
+        serializer = RecipeIdsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        ids = serializer.validated_data['recipes']
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time'
+        ).in_bulk(ids)
+        added = add_user_recipes(model_class, request.user, list(recipes))
+        results = []
+        for pk in ids:
+            if pk not in recipes:
+                results.append({'id': pk, 'status': 'not_found'})
+            elif pk not in added:
+                results.append({'id': pk, 'status': 'already_added'})
+            else:
+                results.append({
+                    'id': pk,
+                    'status': 'added',
+                    'recipe': RecipeShortSerializer(
+                        recipes[pk], context={'request': request}
+                    ).data,
+                })
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def remove_many_from_model(self, model_class, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        removed = remove_user_recipes(model_class, request.user, ids)
+        return Response({'results': [
+            {'id': pk, 'status': 'removed' if pk in removed else 'not_found'}
+            for pk in ids
+        ]}, status=status.HTTP_200_OK)
 
-    def remove_from_model(self, model_class, user, recipe_id):
-        get_object_or_404(
-            model_class,
-            user=user,
-            recipe=get_object_or_404(Recipe, id=recipe_id)
-        ).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        entries = self.paginate_queryset(get_timeline(request.user))
+        recipes = self.get_queryset().in_bulk(
+            [entry['recipe_id'] for entry in entries]
+        )
+        serializer = RecipeSerializer(
+            [
+                recipes[entry['recipe_id']] for entry in entries
+                if entry['recipe_id'] in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return self.get_paginated_response(serializer.data)
 
-    @action(detail=False, methods=["GET"])
+    @action(
+        detail=False,
+        methods=["GET"],
+        permission_classes=[IsAuthenticated]
+    )
     def download_shopping_cart(self, request):
-        return generate_shopping_cart_pdf(request.user)
+        file_format = request.query_params.get("file_format", "pdf")
+        if file_format not in RENDERERS:
+            return Response(
+                {"error": "Поддерживаются форматы: pdf, txt"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return download_shopping_list(request, file_format)
 
     @action(
         detail=True,
@@ -150,37 +378,76 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
-        return self.add_to_model(
-            serializer_class=ShoppingCartSerializer,
-            model_class=ShoppingCart,
-            request=request,
-            pk=pk
-        )
+        return self.add_to_model(ShoppingCart, request, pk)
 
     @shopping_cart.mapping.delete
     def destroy_shopping_cart(self, request, pk):
-        return self.remove_from_model(
-            model_class=ShoppingCart,
-            user=request.user.id,
-            recipe_id=pk
-        )
+        return self.remove_from_model(ShoppingCart, request, pk)
+
+    @action(
+        detail=False,
+        methods=("POST", ),
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        return self.add_many_to_model(ShoppingCart, request)
+
+    @shopping_cart_batch.mapping.delete
+    def destroy_shopping_cart_batch(self, request):
+        return self.remove_many_from_model(ShoppingCart, request)
 
     @action(
         detail=True, methods=("POST", ),
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk):
-        return self.add_to_model(
-            serializer_class=FavoriteSerializer,
-            model_class=Favorite,
-            request=request,
-            pk=pk
-        )
+        return self.add_to_model(Favorite, request, pk)
 
     @favorite.mapping.delete
     def destroy_favorite(self, request, pk):
-        return self.remove_from_model(
-            model_class=Favorite,
-            user=request.user.id,
-            recipe_id=pk
+        return self.remove_from_model(Favorite, request, pk)
+
+    @action(
+        detail=False,
+        methods=("POST", ),
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        return self.add_many_to_model(Favorite, request)
+
+    @favorite_batch.mapping.delete
+    def destroy_favorite_batch(self, request):
+        return self.remove_many_from_model(Favorite, request)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """Профили запросов для персонала: список и скачивание.
+
+    С параметром top вместо файла .prof возвращается текстовая сводка
+    из указанного числа функций.
+    """
+
+    permission_classes = (IsAdminUser,)
+    lookup_value_regex = r'[^/]+'
+
+    def list(self, request):
+        return Response(list_profiles())
+
+    def retrieve(self, request, pk):
+        path = get_profile_path(pk)
+        if path is None:
+            raise Http404
+        top = request.query_params.get('top')
+        if top is None:
+            return FileResponse(open(path, 'rb'), as_attachment=True)
+        try:
+            top = int(top)
+        except ValueError:
+            raise ValidationError({'top': 'Должно быть целым числом'})
+        return HttpResponse(
+            format_profile(path, top), content_type='text/plain'
         )
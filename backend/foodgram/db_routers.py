@@ -0,0 +1,45 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_read_database = ContextVar('read_database', default='default')
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Чтение с одной случайно выбранной реплики внутри блока.
+
+    Реплика выбирается один раз на весь блок, чтобы все чтения запроса
+    видели данные с одинаковым отставанием.
+    """
+    database = 'default'
+    if enabled and settings.REPLICA_DATABASES:
+        database = random.choice(settings.REPLICA_DATABASES)
+    token = _read_database.set(database)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение с реплик там, где это разрешено, запись в основную базу.
+
+    Вне use_replicas() (команды, фоновые задачи, запросы на запись
+    и закрепленные за основной базой пользователи) чтение также идет
+    в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
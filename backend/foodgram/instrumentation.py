@@ -0,0 +1,110 @@
+import logging
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+sql_logger = logging.getLogger('foodgram.sql')
+
+_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса: SQL, сериализация, вьюха и общее время."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.finished = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_time = 0.0
+        self.statements = Counter()
+
+    @property
+    def total_time(self):
+        return (self.finished or perf_counter()) - self.started
+
+    def repeated_statements(self):
+        """Одинаковые запросы, повторенные много раз: вероятные N+1."""
+        return [
+            (sql, count) for sql, count in self.statements.most_common()
+            if count >= settings.N_PLUS_ONE_THRESHOLD
+        ]
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка execute: время и текст каждого запроса к базе."""
+    metrics = _metrics.get()
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.sql_time += duration
+            metrics.statements[sql] += 1
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            sql_logger.warning('slow query', extra={
+                'duration_ms': round(duration * 1000, 1),
+                'sql': sql,
+                'database': context['connection'].alias,
+            })
+
+
+@contextmanager
+def collect_metrics():
+    """Сбор метрик для всех подключений к базам внутри блока."""
+    metrics = RequestMetrics()
+    token = _metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(record_query)
+                )
+            yield metrics
+    finally:
+        metrics.finished = perf_counter()
+        _metrics.reset(token)
+
+
+@contextmanager
+def measure_serializer():
+    """Время сериализации; вложенные сериализаторы не считаются дважды."""
+    metrics = _metrics.get()
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += perf_counter() - started
+        metrics.serializer_depth -= 1
+
+
+@contextmanager
+def measure_view():
+    """Время работы вьюхи без остальных middleware."""
+    metrics = _metrics.get()
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.view_time += perf_counter() - started
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db_routers import use_replicas
+from foodgram.instrumentation import collect_metrics, measure_view
+from foodgram.metrics import record_request
+from foodgram.profiling import profile_request, should_profile
+
+request_logger = logging.getLogger('foodgram.requests')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_COOKIE = 'use_primary'
+
+
+class ReplicaRoutingMiddleware:
+    """Безопасные запросы читают с реплик, остальные с основной базы.
+
+    После успешной записи клиент на REPLICA_STICKY_SECONDS закрепляется
+    за основной базой, чтобы сразу видеть свои изменения несмотря на
+    отставание реплик. Метка хранится в cookie и, для клиентов с
+    токеном без cookie, в кеше по хешу заголовка Authorization.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def get_pin_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.sha1(authorization.encode()).hexdigest()
+        return f'replica-pin:{digest}'
+
+    def is_pinned(self, request):
+        try:
+            if float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        key = self.get_pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        sticky = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            PRIMARY_COOKIE, str(time.time() + sticky),
+            max_age=sticky, httponly=True, samesite='Lax',
+        )
+        key = self.get_pin_key(request)
+        if key is not None:
+            cache.set(key, True, sticky)
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if settings.REPLICA_DATABASES and response.status_code < 400:
+                self.pin(request, response)
+            return response
+        with use_replicas(not self.is_pinned(request)):
+            return self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """Server-Timing, метрики Prometheus и журналы медленных запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        response['Server-Timing'] = metrics.server_timing()
+        total_ms = metrics.total_time * 1000
+        details = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 1),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'serializer_ms': round(metrics.serializer_time * 1000, 1),
+        }
+        record_request(
+            request, response, metrics.total_time, metrics.queries
+        )
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            request_logger.warning('slow request', extra=details)
+        for sql, count in metrics.repeated_statements():
+            request_logger.warning('possible N+1', extra={
+                **details, 'sql': sql, 'repeated': count,
+            })
+        return response
+
+
+class ViewTimingMiddleware:
+    """Время вьюхи для Server-Timing.
+
+    Подключается последним: get_response здесь - вызов вьюхи
+    и отрисовка ее ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with measure_view():
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """Профиль cProfile выбранных запросов в кольцевом буфере на диске.
+
+    Профилируются запросы персонала с заголовком X-Profile и доля
+    PROFILE_SAMPLE_RATE остальных. Имя файла профиля возвращается
+    в заголовке ответа X-Profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        return profile_request(self.get_response, request)
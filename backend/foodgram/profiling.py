@@ -0,0 +1,124 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from foodgram.metrics import get_route
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_NAME = re.compile(
+    r'^(?P<created>\d+)_(?P<method>[A-Z]+)_(?P<route>[\w.-]+)'
+    r'_(?P<duration>\d+)ms\.prof$'
+)
+
+
+def get_api_user(request):
+    """Пользователь запроса до view: DRF проверяет токен только в нем."""
+    drf_request = Request(request)
+    for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication().authenticate(drf_request)
+        except APIException:
+            return None
+        if result is not None:
+            return result[0]
+    return getattr(request, 'user', None)
+
+
+def should_profile(request):
+    """Профиль по заголовку X-Profile от персонала или по выборке."""
+    if request.META.get(PROFILE_HEADER):
+        user = get_api_user(request)
+        return user is not None and user.is_staff
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def prune_profiles(directory):
+    """Удаление старых профилей сверх PROFILE_MAX_FILES."""
+    names = sorted(
+        name for name in os.listdir(directory) if PROFILE_NAME.match(name)
+    )
+    for name in names[:-settings.PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def save_profile(profiler, request, duration):
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    route = re.sub(r'[^\w.-]', '-', get_route(request))
+    name = (
+        f'{time.time_ns()}_{request.method}_{route}'
+        f'_{round(duration * 1000)}ms.prof'
+    )
+    profiler.dump_stats(os.path.join(directory, name))
+    prune_profiles(directory)
+    return name
+
+
+def profile_request(get_response, request):
+    """Выполнение запроса под cProfile с сохранением результата."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # В потоке уже работает другой профилировщик.
+        return get_response(request)
+    started = time.perf_counter()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+    response['X-Profile'] = save_profile(
+        profiler, request, time.perf_counter() - started
+    )
+    return response
+
+
+def list_profiles():
+    """Сохраненные профили, новые первыми."""
+    directory = settings.PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = PROFILE_NAME.match(name)
+        if match is None:
+            continue
+        created = int(match['created']) / 1e9
+        profiles.append({
+            'name': name,
+            'created': datetime.fromtimestamp(created, timezone.utc),
+            'method': match['method'],
+            'route': match['route'],
+            'duration_ms': int(match['duration']),
+            'size': os.path.getsize(os.path.join(directory, name)),
+        })
+    return profiles
+
+
+def get_profile_path(name):
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def format_profile(path, limit):
+    """Текстовая сводка профиля: функции по суммарному времени."""
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return stream.getvalue()
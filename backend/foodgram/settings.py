@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -48,13 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
+    'foodgram.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.middleware.ViewTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -99,6 +105,81 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICAS со списком хостов через запятую
+# (для SQLite - путей к файлам базы).
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.getenv(
+    'DB_REPLICAS', default=''
+).split(','))):
+    alias = f'replica_{index}'
+    location = 'NAME' if DATABASES['default']['ENGINE'].endswith(
+        'sqlite3'
+    ) else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_routers.ReplicaRouter']
+# Сколько секунд после своей записи пользователь читает с основной базы.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Версии справочников и закрепление клиентов за основной базой хранятся
+# в кеше по умолчанию, поэтому он должен быть общим для всех воркеров
+# и management-команд: memcached по адресу из CACHE_LOCATION.
+# LocMemCache подходит только для разработки в одном процессе.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='')
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default=(
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+            if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        )),
+        'LOCATION': CACHE_LOCATION,
+    },
+    'shopping_lists': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shopping_lists',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'foodgram.log_formatters.JsonFormatter'},
+    },
+    'handlers': {
+        'metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'foodgram': {
+            'handlers': ['metrics'],
+            'level': os.getenv('METRICS_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+# Пороги журналов медленных запросов, SQL и повторов одного запроса.
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+# Доля случайно профилируемых запросов и кольцевой буфер профилей.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -140,6 +221,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Загруженные файлы сразу пишутся во временный файл, а не в память.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -180,3 +267,19 @@ RECIPES_MAX_LENGHT = 255
 COLOR_MAX_LENGHT = 7
 UNIT_MAX_LENGHT = 64
 TEXT_MAX_LENGHT = 1500
+SHOPPING_LIST_SPOOL_MAX_SIZE = 1024 * 1024
+SHOPPING_LIST_CACHE_MAX_SIZE = 256 * 1024
+INGREDIENT_SEARCH_LIMIT = 50
+RECIPES_LIMIT_MAX = 50
+RECIPES_BATCH_MAX_SIZE = 100
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_BACKFILL_SIZE = 100
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (320, 'JPEG'),
+    'thumbnail_webp': (320, 'WEBP'),
+    'medium_webp': (960, 'WEBP'),
+}
@@ -0,0 +1,111 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.middleware import PRIMARY_COOKIE, ReplicaRoutingMiddleware
+from recipes.models import Recipe
+from users.models import User
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'])
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    """Выбор базы для чтения: вьюха отвечает алиасом из роутера."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.status = 200
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    def view(self, request):
+        return HttpResponse(
+            router.db_for_read(Recipe), status=self.status
+        )
+
+    def request(self, method, token='first', cookies=None):
+        request = getattr(self.factory, method)(
+            '/api/recipes/', HTTP_AUTHORIZATION=f'Token {token}-{self.id()}'
+        )
+        request.COOKIES.update(cookies or {})
+        return self.middleware(request)
+
+    def test_safe_request_reads_replica(self):
+        self.assertEqual(self.request('get').content, b'replica_0')
+
+    def test_write_reads_primary_and_pins_client(self):
+        response = self.request('post')
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        # Клиент с токеном закреплен и без cookie, другие клиенты - нет.
+        self.assertEqual(self.request('get').content, b'default')
+        self.assertEqual(
+            self.request('get', token='second').content, b'replica_0'
+        )
+
+    def test_pinned_by_cookie(self):
+        cookies = {
+            PRIMARY_COOKIE: self.request('post').cookies[PRIMARY_COOKIE].value
+        }
+        response = self.request('get', token='second', cookies=cookies)
+        self.assertEqual(response.content, b'default')
+
+    def test_failed_write_does_not_pin(self):
+        self.status = 400
+        self.assertNotIn(PRIMARY_COOKIE, self.request('post').cookies)
+        self.status = 200
+        self.assertEqual(self.request('get').content, b'replica_0')
+
+
+@skipUnless(
+    settings.REPLICA_DATABASES,
+    'Нужна реплика: DB_REPLICAS=<хост основной базы> python manage.py test',
+)
+class ReplicaMirrorTest(TransactionTestCase):
+    """Запросы через API на реплике с TEST MIRROR на основную базу.
+
+    Реплика - отдельное подключение, поэтому данные теста должны быть
+    зафиксированы и TestCase не подходит.
+    """
+
+    databases = '__all__'
+
+    def setUp(self):
+        self.replica = settings.REPLICA_DATABASES[0]
+        self.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Анна', last_name='Иванова', password='password',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание', cooking_time=5,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(
+                connections[self.replica]
+            ) as replica:
+                response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        return len(primary), len(replica)
+
+    def test_reads_follow_pin(self):
+        with override_settings(REPLICA_DATABASES=[self.replica]):
+            primary, replica = self.get()
+            self.assertEqual(primary, 0)
+            self.assertGreater(replica, 0)
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.pk}/favorite/'
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertIn(PRIMARY_COOKIE, response.cookies)
+            primary, replica = self.get()
+            self.assertGreater(primary, 0)
+            self.assertEqual(replica, 0)
@@ -0,0 +1,24 @@
+import os
+import shutil
+import tempfile
+
+# Воркеры пишут метрики в общий каталог, а /metrics собирает их вместе.
+# prometheus_client выбирает способ хранения значений при импорте, поэтому
+# переменная задается до любого его импорта, в том числе в этом файле.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-prometheus'),
+)
+
+
+def on_starting(server):
+    """Очистка метрик прошлого запуска."""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
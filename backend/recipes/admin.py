@@ -29,17 +29,12 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
 
-    list_display = ('id', 'name', 'author', 'get_favorites_count', )
+    list_display = ('id', 'name', 'author', 'favorites_count', )
     list_filter = ('name', 'author', 'tags', )
     search_fields = ('name', )
     inlines = (IngredientAmountInline,)
     empty_value_display = '-пусто-'
 
-    def get_favorites_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-
-    get_favorites_count.short_description = 'Добавлен в избранное'
-
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
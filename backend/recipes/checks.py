@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии справочников должны быть общими для всех процессов."""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [Warning(
+        'Кеш по умолчанию не общий для процессов: изменения тегов и '
+        'ингредиентов, в том числе из load_tags и load_ingrs, не сбросят '
+        'справочники и ETag в других воркерах.',
+        hint='Укажите адрес memcached в CACHE_LOCATION.',
+        id='recipes.W001',
+    )]
@@ -0,0 +1,52 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Subscription
+from users.models import User
+
+# Денормализованные счетчики: (модель, поле счетчика,
+# модель подсчитываемых записей, поле связи с владельцем счетчика).
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счетчика без чтения записи."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """Изменение счетчика сразу у нескольких записей одним запросом."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    """Подзапрос количества записей model для внешней записи."""
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def reconcile_counters():
+    """Пересчет разошедшихся счетчиков, возвращает число исправлений."""
+    fixed = {}
+    for model, field, counted_model, related_field in COUNTERS:
+        actual = count_subquery(counted_model, related_field)
+        stale = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        fixed[f'{model._meta.model_name}.{field}'] = (
+            model.objects
+            .filter(pk__in=stale.values('pk'))
+            .update(**{field: actual})
+        )
+    return fixed
@@ -0,0 +1,126 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from recipes.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+Image.MAX_IMAGE_PIXELS = settings.RECIPE_IMAGE_MAX_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def open_image(file):
+    """Открытие изображения с проверкой числа пикселей до декодирования."""
+    image = Image.open(file)
+    width, height = image.size
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(f'Слишком большое изображение: {width}x{height}')
+    return image
+
+
+def render_variant(image, size, image_format):
+    """Уменьшенная копия без метаданных в нужном формате."""
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    has_alpha = image_format == 'WEBP' and 'A' in image.getbands()
+    mode = 'RGBA' if has_alpha else 'RGB'
+    # Пиксели копируются в новое изображение, поэтому EXIF, ICC и
+    # прочие метаданные оригинала не попадают в результат.
+    clean = Image.new(mode, variant.size)
+    clean.paste(variant.convert(mode))
+    buffer = BytesIO()
+    clean.save(buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_variants(recipe_id):
+    """Создание всех вариантов картинки рецепта.
+
+    Результат записывается, только если картинка рецепта не поменялась
+    за время обработки, а файлы предыдущих вариантов удаляются.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants'
+    ).first()
+    if recipe is None or not recipe.image:
+        return None
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(open_image(file))
+        stem = os.path.splitext(os.path.basename(source))[0]
+        files = {}
+        for name, (size, image_format) in (
+            settings.RECIPE_IMAGE_VARIANTS.items()
+        ):
+            files[name] = default_storage.save(
+                f'recipes/variants/{stem}_{name}.{image_format.lower()}',
+                ContentFile(render_variant(image, size, image_format)),
+            )
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants={'source': source, 'files': files},
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        for path in files.values():
+            default_storage.delete(path)
+        return None
+    bump_version('recipes')
+    for path in recipe.image_variants.get('files', {}).values():
+        default_storage.delete(path)
+    return files
+
+
+def run_job(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception('Ошибка обработки картинки рецепта %s', recipe_id)
+
+
+def run_in_worker(recipe_id):
+    close_old_connections()
+    try:
+        run_job(recipe_id)
+    finally:
+        close_old_connections()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Общий пул обработки картинок. Лишний пул при гонке первых вызовов
+    безвреден: потоки в нем создаются только при постановке задач.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.RECIPE_IMAGE_WORKERS,
+        thread_name_prefix='recipe-images',
+    )
+
+
+def schedule_variants(recipe_id):
+    """Постановка обработки картинки в очередь после коммита."""
+    if not settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: run_job(recipe_id))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_worker, recipe_id)
+    )
+
+
+def needs_variants(recipe):
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') != recipe.image.name
+    )
@@ -0,0 +1,343 @@
+import csv
+import io
+import random
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate, islice
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.counters import reconcile_counters
+from recipes.images import render_variant
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.timeline import rebuild_timelines
+from recipes.versions import bump_version
+from users.models import User
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена', 'Олег',
+)
+LAST_NAMES = (
+    'Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов',
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'рагу', 'плов', 'запеканка',
+    'каша', 'котлеты', 'блины',
+)
+ADJECTIVES = (
+    'Домашний', 'Быстрый', 'Летний', 'Острый', 'Сытный', 'Легкий',
+    'Праздничный', 'Бабушкин',
+)
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'добавить', 'посолить', 'варить',
+    'минут', 'на', 'среднем', 'огне', 'подавать', 'горячим', 'с', 'зеленью',
+)
+
+
+class Zipf:
+    """Выбор элементов с вероятностью, обратной степени их ранга.
+
+    Ранги раздаются элементам в случайном порядке, чтобы популярными
+    оказывались не только первые созданные записи.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.weights = [
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ]
+        self.cum_weights = list(accumulate(self.weights))
+        self.rng = rng
+
+    def choice(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect_left(self.cum_weights, point)]
+
+    def sample(self, count, exclude=None):
+        """До count разных элементов; при сильном перекосе может быть
+        меньше, чем запрошено.
+        """
+        chosen = {}
+        for _ in range(10):
+            need = count - len(chosen)
+            if need <= 0:
+                break
+            for item in self.rng.choices(
+                self.items, cum_weights=self.cum_weights, k=need * 2
+            ):
+                if item != exclude:
+                    chosen[item] = None
+        return list(chosen)[:count]
+
+    def allocate(self, total):
+        """Распределение total записей по элементам по закону Ципфа."""
+        scale = total / self.cum_weights[-1]
+        for item, weight in zip(self.items, self.weights):
+            count = round(weight * scale)
+            if count:
+                yield item, count
+
+
+def insert_rows(model, rows, batch_size):
+    """Вставка словарей значений пачками в обход моделей и сигналов.
+
+    В PostgreSQL используется COPY, в остальных базах executemany.
+    Поля, которых нет в строке, получают значение по умолчанию.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in fields
+    )
+    total = 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = [
+                [
+                    field.get_db_prep_save(
+                        row[field.attname] if field.attname in row
+                        else field.get_default(),
+                        connection,
+                    )
+                    for field in fields
+                ]
+                for row in islice(rows, batch_size)
+            ]
+            if not batch:
+                return total
+            total += len(batch)
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    [r'\N' if value is None else value for value in values]
+                    for values in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {table} ({columns}) FROM STDIN '
+                    rf"WITH (FORMAT csv, NULL '\N')",
+                    buffer,
+                )
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'VALUES ({placeholders})',
+                    batch,
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических пользователей, рецептов, избранного, '
+        'корзин и подписок с распределением Ципфа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument(
+            '--ingredients', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+            help='Количество ингредиентов в рецепте',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель распределения Ципфа, больше - сильнее перекос',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора для воспроизводимых наборов',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одной пачке вставки',
+        )
+        parser.add_argument(
+            '--prefix', default='gen',
+            help='Префикс логинов и домен почты созданных пользователей',
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей',
+        )
+
+    def stage(self, title, model, rows):
+        started = perf_counter()
+        count = insert_rows(model, rows, self.batch_size)
+        seconds = perf_counter() - started
+        self.stdout.write(
+            f'{title}: {count} строк за {seconds:.1f} с, '
+            f'{count / max(seconds, 1e-9):.0f} строк/с'
+        )
+        return count
+
+    def make_image(self, prefix):
+        """Одна картинка с готовыми копиями на все созданные рецепты."""
+        image = Image.new('RGB', (1280, 960), (
+            self.rng.randrange(256),
+            self.rng.randrange(256),
+            self.rng.randrange(256),
+        ))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG')
+        source = default_storage.save(
+            f'recipes/{prefix}.jpg', ContentFile(buffer.getvalue())
+        )
+        files = {
+            name: default_storage.save(
+                f'recipes/variants/{prefix}_{name}.{image_format.lower()}',
+                ContentFile(render_variant(image, size, image_format)),
+            )
+            for name, (size, image_format)
+            in settings.RECIPE_IMAGE_VARIANTS.items()
+        }
+        return source, {'source': source, 'files': files}
+
+    def user_rows(self, count, prefix, domain):
+        password = make_password(self.password)
+        now = timezone.now()
+        for number in range(count):
+            yield {
+                'username': f'{prefix}_{number}',
+                'email': f'{number}@{domain}',
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+                'password': password,
+                'date_joined': now,
+            }
+
+    def recipe_rows(self, count, authors, image, variants):
+        now = timezone.now()
+        step = timedelta(days=365) / max(count, 1)
+        for number in range(count):
+            pub_date = now - step * (count - number)
+            yield {
+                'author_id': authors.choice(),
+                'name': (
+                    f'{self.rng.choice(ADJECTIVES)} '
+                    f'{self.rng.choice(DISHES)}'
+                ),
+                'text': ' '.join(self.rng.choices(WORDS, k=30)),
+                'cooking_time': self.rng.randint(5, 180),
+                'image': image,
+                'image_variants': variants,
+                'pub_date': pub_date,
+                'updated_at': pub_date,
+            }
+
+    def tag_rows(self, recipe_ids, tag_ids):
+        for recipe_id in recipe_ids:
+            count = self.rng.randint(1, len(tag_ids))
+            for tag_id in self.rng.sample(tag_ids, count):
+                yield {'recipe_id': recipe_id, 'tag_id': tag_id}
+
+    def amount_rows(self, recipe_ids, ingredients, bounds):
+        for recipe_id in recipe_ids:
+            for ingredient_id in ingredients.sample(self.rng.randint(*bounds)):
+                yield {
+                    'recipe_id': recipe_id,
+                    'ingredient_id': ingredient_id,
+                    'amount': self.rng.randint(1, 500),
+                }
+
+    def link_rows(self, total, users, targets, field):
+        """Связи пользователей с рецептами или авторами: активные
+        пользователи и популярные цели встречаются чаще остальных.
+        """
+        for user_id, count in users.allocate(total):
+            # Исключать сам пользователь нужно только среди авторов:
+            # у рецептов свои id, которые могут совпадать с id пользователя.
+            exclude = user_id if field == 'author_id' else None
+            for target in targets.sample(count, exclude=exclude):
+                yield {'user_id': user_id, field: target}
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.password = options['password']
+        exponent = options['exponent']
+        prefix = options['prefix']
+        domain = f'{prefix}.example.com'
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not tag_ids or not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите теги и ингредиенты: load_tags, load_ingrs'
+            )
+        generated_users = User.objects.filter(email__endswith=f'@{domain}')
+        if generated_users.exists():
+            raise CommandError(
+                f'Пользователи с почтой @{domain} уже есть, '
+                f'укажите другой --prefix'
+            )
+        started = perf_counter()
+        with transaction.atomic():
+            self.stage('Пользователи', User, self.user_rows(
+                options['users'], prefix, domain
+            ))
+            user_ids = list(
+                generated_users.order_by('id').values_list('id', flat=True)
+            )
+            image, variants = self.make_image(prefix)
+            self.stage('Рецепты', Recipe, self.recipe_rows(
+                options['recipes'],
+                Zipf(user_ids, exponent, self.rng),
+                image,
+                variants,
+            ))
+            recipe_ids = list(
+                Recipe.objects
+                .filter(author__in=generated_users)
+                .order_by('id')
+                .values_list('id', flat=True)
+            )
+            self.stage('Теги рецептов', Recipe.tags.through, self.tag_rows(
+                recipe_ids, tag_ids
+            ))
+            self.stage('Ингредиенты рецептов', IngredientAmount,
+                       self.amount_rows(
+                           recipe_ids,
+                           Zipf(ingredient_ids, exponent, self.rng),
+                           options['ingredients'],
+                       ))
+            recipes = Zipf(recipe_ids, exponent, self.rng)
+            for title, model, total, targets, field in (
+                ('Избранное', Favorite, options['favorites'],
+                 recipes, 'recipe_id'),
+                ('Корзины', ShoppingCart, options['carts'],
+                 recipes, 'recipe_id'),
+                ('Подписки', Subscription, options['subscriptions'],
+                 Zipf(user_ids, exponent, self.rng), 'author_id'),
+            ):
+                self.stage(title, model, self.link_rows(
+                    total, Zipf(user_ids, exponent, self.rng),
+                    targets, field,
+                ))
+            # Строки вставлены в обход сигналов, поэтому счетчики,
+            # итоги корзин и ленты пересчитываются целиком.
+            for counter, fixed in reconcile_counters().items():
+                self.stdout.write(f'{counter}: обновлено записей {fixed}')
+            call_command('rebuild_cart_totals', stdout=self.stdout)
+            self.stdout.write(f'Записей в лентах: {rebuild_timelines()}')
+            # Кэшированные ETag списка рецептов тоже устарели.
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Набор данных создан за {perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from recipes.images import generate_variants, needs_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).only('image', 'image_variants').iterator()
+        processed = failed = 0
+        for recipe in recipes:
+            if not options['all'] and not needs_variants(recipe):
+                continue
+            try:
+                generate_variants(recipe.pk)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}, с ошибками: {failed}'
+        ))
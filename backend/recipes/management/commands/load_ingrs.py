@@ -1,28 +1,72 @@
 import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
 
 from django.conf import settings
-from django.core.management import BaseCommand
-from django.db.utils import IntegrityError
+from django.core.management import BaseCommand, CommandError
 
 from recipes.models import Ingredient
+from recipes.versions import bump_version
 
 
 class Command(BaseCommand):
-    help = 'Загрузка из csv файла'
+    help = 'Загрузка ингредиентов из csv или json файла'
 
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
-        with open(
-            f'{data_path}/data/ingredients.csv', 'r', encoding='utf-8'
-        ) as file:
-            reader = csv.reader(file)
-            next(reader)
-            for row in reader:
-                name, unit = row
-                try:
-                    Ingredient.objects.create(name=name, unit=unit)
-                except IntegrityError:
-                    self.stdout.write(
-                        f'Ингредиент {name} уже существует в базе данных'
-                    )
-        self.stdout.write(self.style.SUCCESS('Все ингридиенты загружены!'))
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.BASE_DIR / 'data' / 'ingredients.csv',
+            type=Path,
+            help='Путь к файлу ingredients.csv или ingredients.json',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='Количество строк в одной пачке вставки',
+        )
+
+    def read_rows(self, path):
+        """Построчное чтение пар (название, единица измерения)."""
+        with open(path, 'r', encoding='utf-8') as file:
+            if path.suffix == '.json':
+                for row in json.load(file):
+                    yield row['name'], row['measurement_unit']
+            elif path.suffix == '.csv':
+                reader = csv.reader(file)
+                next(reader)
+                for name, unit in reader:
+                    yield name, unit
+            else:
+                raise CommandError('Поддерживаются только файлы csv и json')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        existing = set(Ingredient.objects.values_list('name', 'unit'))
+        rows = self.read_rows(options['path'])
+        total = created = 0
+        started = perf_counter()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            total += len(batch)
+            new = []
+            for row in batch:
+                if row not in existing:
+                    existing.add(row)
+                    new.append(Ingredient(name=row[0], unit=row[1]))
+            # Ингредиент целиком состоит из уникальной пары (name, unit),
+            # поэтому обновлять при конфликте нечего.
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            created += len(new)
+            self.stdout.write(
+                f'Обработано строк: {total}, новых: {created}, '
+                f'{total / (perf_counter() - started):.0f} строк/с'
+            )
+        bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Все ингридиенты загружены! Новых: {created} из {total}'
+        ))
@@ -0,0 +1,98 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartTotal
+from recipes.shopping_list import (aggregate_all_totals,
+                                   aggregate_shopping_list, get_shopping_list)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересчет и проверка итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить итоги, не пересчитывая их',
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='Проверить список покупок пользователя с этим id '
+                 'и вывести расхождения по ингредиентам',
+        )
+
+    def check_user(self, user_id):
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise CommandError(f'Пользователь {user_id} не найден')
+        expected = {
+            item['ingredient_id']: item
+            for item in aggregate_shopping_list(user)
+        }
+        actual = {
+            item['ingredient_id']: item for item in get_shopping_list(user)
+        }
+        mismatched = 0
+        for ingredient_id in expected.keys() | actual.keys():
+            item = expected.get(ingredient_id) or actual[ingredient_id]
+            in_carts = expected.get(ingredient_id, {}).get('total_amount', 0)
+            in_totals = actual.get(ingredient_id, {}).get('total_amount', 0)
+            if in_carts != in_totals:
+                mismatched += 1
+                self.stdout.write(
+                    f'{item["name"]} ({item["unit"]}): в корзине '
+                    f'{in_carts}, в итогах {in_totals}'
+                )
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в списке покупок: {mismatched}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Список покупок пользователя {user_id} корректен'
+        ))
+
+    def handle(self, *args, **options):
+        if options['user'] is not None:
+            self.check_user(options['user'])
+            return
+        if not options['check']:
+            with transaction.atomic():
+                ShoppingCartTotal.objects.all().delete()
+                ShoppingCartTotal.objects.bulk_create(
+                    (
+                        ShoppingCartTotal(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                        )
+                        for user_id, ingredient_id, amount
+                        in aggregate_all_totals().iterator()
+                    ),
+                    batch_size=1000,
+                )
+            self.stdout.write('Итоги списков покупок пересчитаны')
+
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in aggregate_all_totals().iterator()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        }
+        mismatched = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в итогах списков покупок: {len(mismatched)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги списков покупок корректны: {len(actual)} строк'
+        ))
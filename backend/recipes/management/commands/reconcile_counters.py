@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверка денормализованных счетчиков с фактическими данными'
+
+    def handle(self, *args, **kwargs):
+        for counter, fixed in reconcile_counters().items():
+            self.stdout.write(f'{counter}: исправлено записей {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счетчики сверены'))
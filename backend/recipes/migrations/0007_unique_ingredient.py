@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Слияние повторяющихся ингредиентов перед созданием ограничения."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'unit')
+        .annotate(keep_id=models.Min('id'), count=models.Count('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for group in duplicates:
+        keep_id = group['keep_id']
+        extra_ids = list(
+            Ingredient.objects
+            .filter(name=group['name'], unit=group['unit'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        for model, owner in (
+            (IngredientAmount, 'recipe_id'),
+            (ShoppingCartTotal, 'user_id'),
+        ):
+            for row in model.objects.filter(ingredient_id__in=extra_ids):
+                target = model.objects.filter(
+                    ingredient_id=keep_id, **{owner: getattr(row, owner)}
+                ).first()
+                if target is None:
+                    row.ingredient_id = keep_id
+                    row.save(update_fields=['ingredient'])
+                else:
+                    target.amount += row.amount
+                    target.save(update_fields=['amount'])
+                    row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'unit'), name='unique_ingredient'),
+        ),
+    ]
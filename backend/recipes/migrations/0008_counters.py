@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:21
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    for model, field, counted_model, related_field in (
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Subscription, 'author'),
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+    ):
+        model.objects.update(**{field: Coalesce(models.Subquery(
+            counted_model.objects
+            .filter(**{related_field: models.OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(count=models.Count('pk'))
+            .values('count')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_unique_ingredient'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлен в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TIMELINE_BACKFILL_SIZE = 100
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+
+
+def fill_timelines(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    # Рецепты авторов с большой аудиторией подмешиваются при чтении.
+    subscriptions = Subscription.objects.filter(
+        author__followers_count__lte=TIMELINE_FANOUT_MAX_FOLLOWERS
+    )
+    for subscription in subscriptions.iterator():
+        recipes = (
+            Recipe.objects
+            .filter(author_id=subscription.author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('id', 'pub_date')[:TIMELINE_BACKFILL_SIZE]
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user_id=subscription.user_id,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ('-pub_date', '-recipe_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
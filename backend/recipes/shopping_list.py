@@ -0,0 +1,132 @@
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingCartTotal
+
+
+def aggregate_shopping_list(user):
+    """Сводный список покупок, посчитанный по содержимому корзины.
+
+    Количества суммируются на стороне базы данных с группировкой по
+    ингредиенту, поэтому одинаковые названия с разными единицами
+    измерения не смешиваются.
+    """
+    return (
+        IngredientAmount.objects
+        .filter(recipe__in=ShoppingCart.objects.filter(
+            user=user
+        ).values('recipe'))
+        .values(
+            'ingredient_id',
+            name=F('ingredient__name'),
+            unit=F('ingredient__unit'),
+        )
+        .annotate(total_amount=Sum('amount'))
+        .order_by('name', 'unit')
+    )
+
+
+def aggregate_all_totals():
+    """Итоги всех корзин, посчитанные заново: (user_id, ingredient_id, amount).
+    """
+    return (
+        ShoppingCart.objects
+        .filter(recipe__ingredients__isnull=False)
+        .values_list('user_id', 'recipe__ingredients__ingredient_id')
+        .annotate(total=Sum('recipe__ingredients__amount'))
+        .order_by()
+    )
+
+
+def get_shopping_list(user):
+    """Сводный список покупок из поддерживаемой таблицы итогов."""
+    return (
+        ShoppingCartTotal.objects
+        .filter(user=user)
+        .values(
+            'ingredient_id',
+            name=F('ingredient__name'),
+            unit=F('ingredient__unit'),
+            total_amount=F('amount'),
+        )
+        .order_by('name', 'unit')
+    )
+
+
+def add_recipes_to_totals(recipe_ids, user=None):
+    """Прибавляет ингредиенты рецептов к итогам корзин.
+
+    Учитываются корзины, в которых рецепты уже лежат: только корзина
+    ``user`` либо все корзины, если пользователь не указан.
+    Вызывается в той же транзакции, что и изменение корзины.
+    """
+    if not recipe_ids:
+        return
+    totals = ShoppingCartTotal._meta.db_table
+    params = list(recipe_ids)
+    placeholders = ', '.join(['%s'] * len(params))
+    user_filter = ''
+    if user is not None:
+        user_filter = 'AND cart.user_id = %s'
+        params.append(user.pk)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {totals} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, ia.ingredient_id, SUM(ia.amount) '
+            f'FROM {ShoppingCart._meta.db_table} cart '
+            f'JOIN {IngredientAmount._meta.db_table} ia '
+            f'ON ia.recipe_id = cart.recipe_id '
+            f'WHERE cart.recipe_id IN ({placeholders}) {user_filter} '
+            f'GROUP BY cart.user_id, ia.ingredient_id '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            f'SET amount = {totals}.amount + EXCLUDED.amount',
+            params,
+        )
+
+
+def subtract_recipes_from_totals(recipe_ids, user):
+    """Вычитает из итогов корзины user ингредиенты уже удаленных рецептов.
+    """
+    if not recipe_ids:
+        return
+    amounts = IngredientAmount.objects.filter(recipe_id__in=recipe_ids)
+    totals = ShoppingCartTotal.objects.filter(
+        user=user, ingredient__in=amounts.values('ingredient')
+    )
+    removed = amounts.filter(ingredient=OuterRef('ingredient')).order_by(
+    ).values('ingredient').annotate(total=Sum('amount')).values('total')
+    totals.update(amount=F('amount') - Subquery(removed))
+    totals.filter(amount__lte=0).delete()
+
+
+def apply_totals_deltas(recipe_id, deltas):
+    """Изменение итогов корзин с рецептом после правки его ингредиентов.
+
+    deltas: изменение количества по id ингредиента, новые ингредиенты
+    добавляются в итоги, а обнулившиеся строки удаляются.
+    """
+    if not deltas:
+        return
+    totals = ShoppingCartTotal._meta.db_table
+    rows = ' UNION ALL '.join(
+        ['SELECT %s AS ingredient_id, %s AS delta'] * len(deltas)
+    )
+    params = [value for item in deltas.items() for value in item]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {totals} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, deltas.ingredient_id, deltas.delta '
+            f'FROM {ShoppingCart._meta.db_table} cart '
+            f'CROSS JOIN ({rows}) deltas '
+            f'WHERE cart.recipe_id = %s '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            f'SET amount = {totals}.amount + EXCLUDED.amount',
+            [*params, recipe_id],
+        )
+    ShoppingCartTotal.objects.filter(
+        user__in=ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values('user'),
+        ingredient__in=list(deltas),
+        amount__lte=0,
+    ).delete()
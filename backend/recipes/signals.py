@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.counters import change_counter
+from recipes.images import needs_variants, schedule_variants
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.shopping_list import (add_recipes_to_totals, apply_totals_deltas,
+                                   subtract_recipes_from_totals)
+from recipes.timeline import (backfill_timeline, fan_out_recipe,
+                              remove_from_timeline)
+from recipes.versions import bump_version
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientAmount)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    # Версия списка рецептов для ETag: меняется при любом изменении
+    # рецептов и данных их авторов.
+    bump_version('recipes')
+
+
+# Поля автора, которые выводятся в списке рецептов. Остальные
+# сохранения пользователя, например last_login при каждом входе,
+# версию не меняют.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(instance, update_fields, **kwargs):
+    instance._author_fields = None
+    if instance.pk and (
+        update_fields is None or set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        instance._author_fields = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, **kwargs):
+    previous = getattr(instance, '_author_fields', None)
+    current = tuple(getattr(instance, field) for field in AUTHOR_FIELDS)
+    if previous is not None and previous != current:
+        recipes_changed()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Subscription)
+def counted_created(sender, instance, created, **kwargs):
+    if created:
+        update_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Subscription)
+def counted_deleted(sender, instance, **kwargs):
+    update_counter(sender, instance, -1)
+
+
+def update_counter(sender, instance, delta):
+    if sender is Recipe:
+        change_counter(User, instance.author_id, 'recipes_count', delta)
+    elif sender is Favorite:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', delta)
+    else:
+        change_counter(User, instance.author_id, 'followers_count', delta)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_recipe(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, **kwargs):
+    if needs_variants(instance):
+        schedule_variants(instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    remove_from_timeline(instance.user_id, instance.author_id)
+
+
+# Итоги корзин при изменениях через ORM: админка, каскадное удаление
+# рецепта или его автора. Пакетные и raw-пути (API корзины, правка
+# рецепта) сигналов не отправляют и обновляют итоги сами.
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=IngredientAmount)
+def remember_previous(sender, instance, **kwargs):
+    instance._previous = (
+        sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_saved(instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+            instance.user_id, instance.recipe_id
+        ):
+            return
+        subtract_recipes_from_totals([previous.recipe_id], previous.user_id)
+    add_recipes_to_totals([instance.recipe_id], instance.user)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_item_deleted(instance, **kwargs):
+    # После удаления строки корзины вычитаются еще оставшиеся
+    # ингредиенты рецепта. При каскадном удалении рецепта строки
+    # корзин и ингредиентов удаляются в любом порядке, и вычитание
+    # происходит ровно один раз: на второй стороне связи уже нет.
+    subtract_recipes_from_totals([instance.recipe_id], instance.user_id)
+
+
+@receiver(post_save, sender=IngredientAmount)
+def ingredient_amount_saved(instance, **kwargs):
+    deltas = {instance.ingredient_id: instance.amount}
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        if previous.recipe_id == instance.recipe_id:
+            deltas[previous.ingredient_id] = (
+                deltas.get(previous.ingredient_id, 0) - previous.amount
+            )
+        else:
+            apply_totals_deltas(
+                previous.recipe_id, {previous.ingredient_id: -previous.amount}
+            )
+    apply_totals_deltas(instance.recipe_id, {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    })
+
+
+@receiver(post_delete, sender=IngredientAmount)
+def ingredient_amount_deleted(instance, **kwargs):
+    apply_totals_deltas(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
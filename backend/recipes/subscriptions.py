@@ -0,0 +1,46 @@
+from django.db import transaction
+
+from recipes.counters import change_counter
+from recipes.models import Subscription
+from recipes.timeline import backfill_timeline, remove_from_timeline
+from recipes.user_recipes import execute_returning
+from users.models import User
+
+
+@transaction.atomic
+def create_subscription(user, author_id):
+    """Подписка одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает автора, если подписка создана, и None, если автора нет
+    или подписка уже существует. Счетчик подписчиков и лента
+    обновляются здесь, так как сигналы не отправляются.
+    """
+    created = execute_returning(
+        f'INSERT INTO {Subscription._meta.db_table} (user_id, author_id) '
+        f'SELECT %s, id FROM {User._meta.db_table} '
+        f'WHERE id = %s AND id <> %s '
+        f'ON CONFLICT (user_id, author_id) DO NOTHING '
+        f'RETURNING id',
+        [user.pk, author_id, user.pk],
+    )
+    if not created:
+        return None
+    change_counter(User, author_id, 'followers_count', 1)
+    author = User.objects.get(pk=author_id)
+    backfill_timeline(user, author)
+    return author
+
+
+@transaction.atomic
+def delete_subscription(user, author_id):
+    """Отписка одним DELETE ... RETURNING, True если подписка была."""
+    deleted = execute_returning(
+        f'DELETE FROM {Subscription._meta.db_table} '
+        f'WHERE user_id = %s AND author_id = %s RETURNING id',
+        [user.pk, author_id],
+    )
+    if not deleted:
+        return False
+    change_counter(User, author_id, 'followers_count', -1)
+    remove_from_timeline(user, author_id)
+    return True
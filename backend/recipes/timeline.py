@@ -0,0 +1,115 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from recipes.models import Recipe, Subscription, TimelineEntry
+from users.models import User
+
+
+def is_fanned_out(author):
+    """Рецепты авторов с огромной аудиторией в ленты не рассылаются,
+    а подмешиваются при чтении, чтобы таблица ленты не разрасталась.
+    """
+    return author.followers_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_recipe(recipe):
+    """Рассылка нового рецепта в ленты подписчиков автора пачками."""
+    if not is_fanned_out(recipe.author):
+        return
+    followers = (
+        Subscription.objects
+        .filter(author_id=recipe.author_id)
+        .order_by('id')
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE)
+    )
+    while True:
+        batch = list(islice(followers, settings.TIMELINE_FANOUT_BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, recipe=recipe, pub_date=recipe.pub_date
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def backfill_timeline(user, author):
+    """Добавление последних рецептов автора в ленту нового подписчика."""
+    if not is_fanned_out(author):
+        return
+    recipes = (
+        Recipe.objects
+        .filter(author=author)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user=user, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_timeline(user, author):
+    """Удаление рецептов автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user=user, recipe__author=author
+    ).delete()
+
+
+@transaction.atomic
+def rebuild_timelines():
+    """Заполнение всех лент заново по подпискам одним запросом.
+
+    Нужно после массовой загрузки данных в обход сигналов. Как и при
+    подписке, в ленту попадают только последние рецепты каждого автора.
+    Возвращает число записей в лентах.
+    """
+    TimelineEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, recipe_id, pub_date) '
+            f'SELECT sub.user_id, recipe.id, recipe.pub_date '
+            f'FROM {Subscription._meta.db_table} sub '
+            f'JOIN {User._meta.db_table} author ON author.id = sub.author_id '
+            f'JOIN ('
+            f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Recipe._meta.db_table}'
+            f') recipe ON recipe.author_id = sub.author_id '
+            f'WHERE author.followers_count <= %s AND recipe.position <= %s',
+            [
+                settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+                settings.TIMELINE_BACKFILL_SIZE,
+            ],
+        )
+        return cursor.rowcount
+
+
+def get_timeline(user):
+    """Лента пользователя: (recipe_id, pub_date) от новых к старым."""
+    entries = TimelineEntry.objects.filter(user=user).values(
+        'recipe_id', 'pub_date'
+    )
+    pulled_authors = Subscription.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values('author')
+    if pulled_authors.exists():
+        entries = entries.order_by().union(
+            Recipe.objects
+            .filter(author__in=pulled_authors)
+            .order_by()
+            .values('id', 'pub_date')
+        )
+    return entries.order_by('-pub_date', '-recipe_id')
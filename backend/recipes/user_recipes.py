@@ -0,0 +1,69 @@
+from django.db import connection, transaction
+
+from recipes.counters import change_counters
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.shopping_list import (add_recipes_to_totals,
+                                   subtract_recipes_from_totals)
+
+
+def after_added(model, user, recipe_ids):
+    if model is Favorite:
+        change_counters(Recipe, recipe_ids, 'favorites_count', 1)
+    elif model is ShoppingCart:
+        add_recipes_to_totals(recipe_ids, user)
+
+
+def after_removed(model, user, recipe_ids):
+    if model is Favorite:
+        change_counters(Recipe, recipe_ids, 'favorites_count', -1)
+    elif model is ShoppingCart:
+        subtract_recipes_from_totals(recipe_ids, user)
+
+
+def execute_returning(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+@transaction.atomic
+def add_user_recipes(model, user, recipe_ids):
+    """Добавление рецептов в избранное или корзину одним запросом.
+
+    INSERT ... ON CONFLICT DO NOTHING пропускает несуществующие рецепты
+    и уже добавленные записи, в том числе вставленные параллельным
+    запросом, и возвращает множество действительно добавленных id.
+    Сигналы при этом не отправляются, поэтому счетчики и итоги корзины
+    обновляются здесь же.
+    """
+    if not recipe_ids:
+        return set()
+    added = execute_returning(
+        f'INSERT INTO {model._meta.db_table} (user_id, recipe_id) '
+        f'SELECT %s, id FROM {Recipe._meta.db_table} '
+        f'WHERE id IN ({", ".join(["%s"] * len(recipe_ids))}) '
+        f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+        f'RETURNING recipe_id',
+        [user.pk, *recipe_ids],
+    )
+    after_added(model, user, added)
+    return set(added)
+
+
+@transaction.atomic
+def remove_user_recipes(model, user, recipe_ids):
+    """Удаление рецептов из избранного или корзины одним запросом.
+
+    Возвращает множество удаленных id.
+    """
+    if not recipe_ids:
+        return set()
+    removed = execute_returning(
+        f'DELETE FROM {model._meta.db_table} '
+        f'WHERE user_id = %s '
+        f'AND recipe_id IN ({", ".join(["%s"] * len(recipe_ids))}) '
+        f'RETURNING recipe_id',
+        [user.pk, *recipe_ids],
+    )
+    after_removed(model, user, removed)
+    return set(removed)
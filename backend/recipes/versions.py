@@ -0,0 +1,33 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Текущая версия набора данных.
+
+    Начальное значение берется от времени, чтобы версия после очистки
+    кэша не совпала с одной из прежних.
+    """
+    return cache.get_or_set(get_version_key(name), time.time_ns, None)
+
+
+def bump_version(name):
+    """Отмечает изменение набора данных после фиксации транзакции.
+
+    Иначе конкурентный запрос успел бы прочитать старые строки
+    и сохранить их под новой версией.
+    """
+    transaction.on_commit(lambda: increment_version(name))
+
+
+def increment_version(name):
+    try:
+        cache.incr(get_version_key(name))
+    except ValueError:
+        get_version(name)
@@ -5,7 +5,10 @@ from .models import User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name',)
+    list_display = (
+        'id', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
+    )
     list_filter = ('email', 'username',)
     search_fields = ('email', 'username',)
     empty_value_display = '-пусто-'